@@ -1,41 +1,321 @@
 from util import (remove_newlines_in_quotes, get_before_inc_dec,
-    remove_blank_lines, move_declarations_to_top)
+    remove_blank_lines, move_declarations_to_top, find_matching_brace,
+    mask_comments_and_strings, split_line_comment)
 
 #!/usr/bin/env python3
 """
 Main translator class for converting C code to Fortran.
 """
 
+import concurrent.futures
+import functools
 import re
 
+# Regular expressions used by the translator, compiled once at import time.
+_PP_DEL_RE = re.compile(r'^[ \t]*#(?![ \t]*include\b)[^\n]*\n?', re.MULTILINE)
+_PP_INC_RE = re.compile(r'^[ \t]*#[ \t]*include\b[^\n]*', re.MULTILINE)
+_FUNC_HDR_RE = re.compile(r'(\w+)\s+(\w+)\s*\(([^)]*)\)\s*\{')
+# A declaration statement, in group 1, optionally followed by a // comment
+_DECL_RE = re.compile(r'\s*((?:int|float|double|char|long)\s.*?;)\s*(?://.*)?$')
+# The type and the declarator list of a declaration statement
+_DECL_HEAD_RE = re.compile(r'\s*(int|float|double|char|long)\s+(.*)')
+_FOR_DECL_RE = re.compile(r'(int|float|double|char|long)\s+(\w+)\s*=')
+# Deletion table for the pointer and reference marks on parameter names
+_PTR_REF_DELETE = str.maketrans('', '', '*&')
+_COND_OP_RE = re.compile(r'<=|>=|!=|==|<|>')
+_PRINTF_RE = re.compile(r'printf\s*\(\s*"(.*?)"\s*(,\s*(.*))?\s*\)')
+_SCANF_RE = re.compile(r'scanf\s*\(\s*"([^"]*)"\s*(,\s*(.*))?\s*\)')
+_SIZEOF_RE = re.compile(r'sizeof\s*\(\s*(\w+)\s*\)')
+_STMT_RE = re.compile(r'\w+|[{}]$|//')  # leading token of a statement
+# Brackets and commas, the characters that _split_top_level looks at
+_LIST_PUNCT_RE = re.compile(r'[{}()\[\],]')
+_ASSIGN_RE = re.compile(r'(?<![=<>!])=(?!=)')  # '=' that is not part of a comparison
+_UPDATE_OP_RE = re.compile(r'(\w+)\s*([\+\-\*/])=\s*(.+)')
+
+# Kinds of open blocks tracked while translating a function body.
+_IF_BLOCK, _FOR_BLOCK, _WHILE_BLOCK = range(3)
+
+# C operators and constants with their Fortran replacements. Longer
+# operators come first in the alternation so that '>=' is never split
+# into '>' followed by '='.
+_TOKEN_MAP = {
+    'INT_MAX': 'huge(0)',
+    'INT_MIN': '-huge(0)',
+    'LONG_MAX': 'huge(0)',
+    'NULL': 'null()',
+    '==': ' == ',
+    '!=': ' /= ',
+    '>=': ' >= ',
+    '<=': ' <= ',
+    '&&': ' .and. ',
+    '||': ' .or. ',
+    '>': ' > ',
+    '<': ' < ',
+    # Shifts not rewritten by _rewrite_shifts are kept whole rather than read
+    # as two comparisons.
+    '<<': '<<',
+    '>>': '>>',
+}
+_TOKEN_RE = re.compile(r'\b(?:INT_MAX|INT_MIN|LONG_MAX|NULL)\b|<<|>>|==|!=|>=|<=|&&|\|\||[<>]')
+
+def _token_replacement(match):
+    """Return the Fortran replacement for a token matched by _TOKEN_RE."""
+    return _TOKEN_MAP[match.group(0)]
+
+def _split_top_level(text):
+    """Split text at the commas that are not inside brackets or literals."""
+    parts = []
+    depth = 0
+    part_start = 0
+    for match in _LIST_PUNCT_RE.finditer(mask_comments_and_strings(text)):
+        c = match.group()
+        if c in '{([':
+            depth += 1
+        elif c != ',':
+            depth -= 1
+        elif depth == 0:
+            parts.append(text[part_start:match.start()])
+            part_start = match.end()
+    parts.append(text[part_start:])
+    return parts
+
+def _brace_list_elements(text, start):
+    """
+    Parse the brace-enclosed initializer list that opens at text[start].
+    Returns (end, elements): the index of the closing brace, or -1 if there is
+    none, and the tuple of elements, with nested lists flattened in C storage order.
+    """
+    end = find_matching_brace(text, start)
+    if end == -1:
+        return -1, ()
+    elements = []
+    for item in _split_top_level(text[start+1:end]):
+        item = item.strip()
+        if item.startswith('{'):
+            elements.extend(_brace_list_elements(item, 0)[1])
+        elif item:
+            elements.append(item)
+    return end, tuple(elements)
+
+def _rewrite_brace_lists(expr):
+    """Rewrite C initializer lists such as {1, 2} as Fortran array constructors [1, 2]."""
+    parts = []
+    pos = 0
+    i = expr.find('{')
+    while i != -1:
+        end, elements = _brace_list_elements(expr, i)
+        if end == -1:
+            break
+        parts.append(expr[pos:i])
+        parts.append(f"[{', '.join(elements)}]")
+        pos = end + 1
+        i = expr.find('{', pos)
+    parts.append(expr[pos:])
+    return ''.join(parts)
+
+def _rewrite_subscripts(expr):
+    """Rewrite C subscripts such as a[i] as Fortran a(i+1) in one scan.
+
+    Nested subscripts are rewritten recursively. Declarations are translated
+    with rank 1, so consecutive subscripts such as m[i][j] are left as they are.
+    """
+    parts = []
+    pos = 0
+    n = len(expr)
+    i = expr.find('[')
+    while i != -1:
+        # Only a bracket that follows a name, possibly after blanks, is a subscript.
+        name_end = i
+        while name_end > pos and expr[name_end - 1].isspace():
+            name_end -= 1
+        if name_end == pos or not (expr[name_end - 1].isalnum() or expr[name_end - 1] == '_'):
+            i = expr.find('[', i + 1)
+            continue
+        close = find_matching_brace(expr, i)
+        index = expr[i + 1:close].strip() if close != -1 else ''
+        if not index:
+            i = expr.find('[', i + 1)
+            continue
+        end = close + 1
+        while end < n and expr[end].isspace():
+            end += 1
+        if end < n and expr[end] == '[':
+            # Skip the whole multi-dimensional access.
+            while end < n and expr[end] == '[':
+                end = find_matching_brace(expr, end)
+                if end == -1:
+                    end = n
+                    break
+                end += 1
+            i = expr.find('[', end)
+            continue
+        parts.append(expr[pos:name_end])
+        parts.append(f"({_rewrite_subscripts(index)}+1)")
+        pos = close + 1
+        i = expr.find('[', pos)
+    parts.append(expr[pos:])
+    return ''.join(parts)
+
+# Operators that bind more loosely than a shift, and so end its operands.
+# Longer operators come first so that '<<=' is not read as '<<' and '='.
+_SHIFT_BOUNDARY_RE = re.compile(r'->|<<=|>>=|<<|>>|<=|>=|==|!=|&&|\|\||[,=<>&|^?:;{}()\[\]]')
+
+def _shift_run(operands, ops):
+    """
+    Return the Fortran text for the run operands[0] ops[0] operands[1] ... of C
+    shifts, folded from the left as C groups them. A run with an empty operand
+    is returned unchanged.
+    """
+    if not ops:
+        return operands[0]
+    values = [operand.strip() for operand in operands]
+    if not all(values):
+        return operands[0] + ''.join(op + operand for op, operand in zip(ops, operands[1:]))
+    result = values[0]
+    for op, count in zip(ops, values[1:]):
+        result = f"{'ishft' if op == '<<' else 'shifta'}({result}, {count})"
+    lead = operands[0][:len(operands[0]) - len(operands[0].lstrip())]
+    trail = operands[-1][len(operands[-1].rstrip()):]
+    return lead + result + trail
+
+def _rewrite_shifts(expr):
+    """
+    Rewrite C shifts as Fortran ishft (<<) and shifta (>>) calls.
+
+    Only the operators of lower precedence than a shift, and the ends of a
+    bracketed group, bound its operands, so a << 2 + 1 becomes ishft(a, 2 + 1)
+    and a >> b >> c becomes shifta(shifta(a, b), c). Groups are rewritten
+    recursively. If the brackets are unbalanced the expression is returned as is.
+    """
+    masked = mask_comments_and_strings(expr)
+    parts = []
+    operands = []   # operands of the current run of shifts
+    ops = []
+    current = []    # pieces of the operand being scanned
+    pos = 0
+    match = _SHIFT_BOUNDARY_RE.search(masked)
+    while match:
+        token = match.group()
+        start = match.start()
+        if token == '->':
+            match = _SHIFT_BOUNDARY_RE.search(masked, match.end())
+            continue
+        current.append(expr[pos:start])
+        if token in '([':
+            close = find_matching_brace(masked, start)
+            if close == -1:
+                return expr
+            current.append(expr[start] + _rewrite_shifts(expr[start+1:close]) + expr[close])
+            pos = close + 1
+        else:
+            operands.append(''.join(current))
+            current = []
+            pos = match.end()
+            if token in ('<<', '>>'):
+                ops.append(token)
+            else:
+                parts.append(_shift_run(operands, ops))
+                parts.append(token)
+                operands = []
+                ops = []
+        match = _SHIFT_BOUNDARY_RE.search(masked, pos)
+    current.append(expr[pos:])
+    operands.append(''.join(current))
+    parts.append(_shift_run(operands, ops))
+    return ''.join(parts)
+
+# Matches any expression that translate_expression could change.
+_EXPR_TRIGGER_RE = re.compile(r'[\[{=!<>&|]|INT_MAX|INT_MIN|LONG_MAX|NULL|sizeof')
+
+# Fortran types of C types, keyed by the normalized type name
+_TYPE_MAP = {
+    'int': "integer",
+    'short': "integer",
+    'unsigned': "integer",  # Fortran doesn't have unsigned types
+    'unsigned int': "integer",
+    'long': "integer(kind=4)",  # long is typically 32-bit
+    'long long': "integer(kind=8)",  # long long is 64-bit
+    'float': "real",
+    'double': "double precision",  # or real(kind=8)
+    'char': "character",
+    'char *': "character(len=100)",  # Arbitrary length
+    'bool': "logical",
+    'void': "void",
+}
+# Checked in order for other spellings, such as 'unsigned long' or 'const char *'.
+# 'char' comes before 'unsigned' so that 'unsigned char' stays a character.
+_TYPE_KEYWORDS = (
+    ('double', "double precision"),
+    ('float', "real"),
+    ('long long', "integer(kind=8)"),
+    ('long', "integer(kind=4)"),
+    ('int', "integer"),
+    ('short', "integer"),
+    ('char *', "character(len=100)"),
+    ('char', "character"),
+    ('unsigned', "integer"),
+    ('bool', "logical"),
+    ('void', "void"),
+)
+
+@functools.lru_cache(maxsize=None)
+def _translate_type(c_type):
+    """Translate C type to Fortran type (cached, as the set of types is small)."""
+    c_type = " ".join(c_type.lower().replace('*', ' * ').split())
+    fortran_type = _TYPE_MAP.get(c_type)
+    if fortran_type is not None:
+        return fortran_type
+    for keyword, fortran_type in _TYPE_KEYWORDS:
+        if keyword in c_type:
+            return fortran_type
+    return "! Unknown type: " + c_type
+
+
 class CToFortranTranslator:
     def __init__(self):
-        self.variables = set()
         self.functions = {}
         self.current_function = None
+        # Name of the result variable of the current function
+        self.result_name = None
         self.indent_level = 0
         self.indent_str = "  "  # Two spaces for indentation
+        # Indentation string for each level, extended as deeper levels are reached
+        self._indent_cache = [self.indent_str * level for level in range(8)]
         # Track variable declarations for proper array handling
         self.variable_types = {}
+        # Translations of C expressions already seen
+        self._expr_cache = {}
+        # Open blocks, innermost last: the kind of each block (_IF_BLOCK,
+        # _FOR_BLOCK or _WHILE_BLOCK) and the indent level to restore when it closes
+        self.block_types = []
+        self.block_indents = []
 
     def indent(self):
         """Return the current indentation string."""
-        return self.indent_str * self.indent_level
+        try:
+            return self._indent_cache[self.indent_level]
+        except IndexError:
+            cache = self._indent_cache
+            cache.extend(self.indent_str * level
+                         for level in range(len(cache), self.indent_level + 1))
+            return cache[self.indent_level]
 
     def translate_file(self, input_file, output_file,
-        blank_lines_allowed=True, move_dec=False):
+        blank_lines_allowed=True, move_dec=False, workers=1):
         """Translate a C file to Fortran."""
         
         try:
             with open(input_file, 'r') as f:
                 c_code = f.read()        
-            fortran_code = self.translate_code(c_code)
+            fortran_code = self.translate_code(c_code, workers=workers)
             if move_dec:
                 fortran_code = move_declarations_to_top(fortran_code)
+            if not blank_lines_allowed:
+                fortran_code = remove_blank_lines(fortran_code)
             with open(output_file, 'w') as f:
-                for line in fortran_code.splitlines():
-                    if blank_lines_allowed or line.strip() != "":
-                        f.write(line + '\n')
+                f.write(fortran_code)
+                if fortran_code and not fortran_code.endswith('\n'):
+                    f.write('\n')
                 
             print(f"Translation complete. Output written to {output_file}")
             return True
@@ -43,8 +323,13 @@ class CToFortranTranslator:
             print(f"Error during translation: {str(e)}")
             raise
 
-    def translate_code(self, c_code):
-        """Translate C code to Fortran with non-main functions in a module."""
+    def translate_code(self, c_code, workers=1):
+        """
+        Translate C code to Fortran with non-main functions in a module.
+        With workers > 1 the bodies of the non-main functions are translated in
+        parallel by that many processes. Starting the processes costs more than
+        translating a small file, so this only pays off for large inputs.
+        """
         c_code = self.remove_preprocessor_directives(c_code)
         c_functions = self.extract_functions(c_code)
         
@@ -56,182 +341,166 @@ class CToFortranTranslator:
             else:
                 non_main_funcs[func_name] = body
         
-        module_code = ""
+        translated_bodies = None
+        if workers > 1 and len(non_main_funcs) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                translated_bodies = dict(zip(non_main_funcs, executor.map(
+                    _translate_function_body, non_main_funcs, non_main_funcs.values())))
+
+        module_code = []
         used_function_names = []
         if non_main_funcs:
-            module_code += "module m_mod\n"
-            module_code += "implicit none\n"
-            module_code += "contains\n\n"
+            module_code.append("module m_mod\n")
+            module_code.append("implicit none\n")
+            module_code.append("contains\n\n")
             for func_name, func_body in non_main_funcs.items():
                 self.current_function = func_name
+                self.result_name = f"{func_name}_result"
                 func_info = self.functions[func_name]
-                return_type = func_info["return_type"]
-                params = func_info["params"]
-                fortran_type = self.translate_type(return_type)
-                if fortran_type.lower() == "void":
-                    module_code += f"subroutine {func_name}("
+                fortran_type = func_info["fortran_return_type"]
+                fortran_params = func_info["fortran_params"]
+                is_subroutine = fortran_type == "void"
+                if is_subroutine:
+                    module_code.append(f"subroutine {func_name}(")
+                else:
+                    module_code.append(f"function {func_name}(")
+                module_code.append(", ".join(name for _, name in fortran_params))
+                if is_subroutine:
+                    module_code.append(")\n")
                 else:
-                    module_code += f"function {func_name}("
-                param_list = []
-                for param in params:
-                    param_name = param.split()[-1].replace("*", "").replace("&", "")
-                    param_list.append(param_name)
-                module_code += ", ".join(param_list)
-                if fortran_type.lower() == "void":
-                    module_code += ")\n"
+                    module_code.append(f") result({self.result_name})\n")
+                module_code.append("implicit none\n")
+                for fortran_type_param, param_name in fortran_params:
+                    module_code.append(f"  {fortran_type_param}, intent(in) :: {param_name}\n")
+                if not is_subroutine:
+                    module_code.append(f"  {fortran_type} :: {self.result_name}\n")
+                if translated_bodies is not None:
+                    translated_body = translated_bodies[func_name]
                 else:
-                    module_code += f") result({func_name}_result)\n"
-                module_code += "implicit none\n"
-                for param in params:
-                    param_parts = param.split()
-                    param_type = " ".join(param_parts[:-1])
-                    param_name = param_parts[-1].replace("*", "").replace("&", "")
-                    fortran_type_param = self.translate_type(param_type)
-                    module_code += f"  {fortran_type_param}, intent(in) :: {param_name}\n"
-                if fortran_type.lower() != "void":
-                    module_code += f"  {fortran_type} :: {func_name}_result\n"
-                translated_body = self.translate_function_body_iterative(func_body)
-                module_code += translated_body
-                if fortran_type.lower() == "void":
-                    module_code += f"end subroutine {func_name}\n\n"
+                    translated_body = self.translate_function_body_iterative(func_body)
+                module_code.append(translated_body)
+                if is_subroutine:
+                    module_code.append(f"end subroutine {func_name}\n\n")
                 else:
-                    module_code += f"end function {func_name}\n\n"
+                    module_code.append(f"end function {func_name}\n\n")
                 used_function_names.append(func_name)
-            module_code += "end module m_mod\n\n"
+            module_code.append("end module m_mod\n\n")
         
-        main_prog = ""
-        main_prog += "program main\n"
+        main_prog = ["program main\n"]
         if used_function_names:
-            main_prog += "use m_mod, only: " + ", ".join(used_function_names) + "\n"
-        main_prog += "implicit none\n\n"
+            main_prog.append(f"use m_mod, only: {', '.join(used_function_names)}\n")
+        main_prog.append("implicit none\n\n")
         if main_body:
             self.current_function = "main"
             translated_main = self.translate_function_body_iterative(main_body, is_main=True)
-            main_prog += translated_main
+            main_prog.append(translated_main)
         else:
-            main_prog += "  ! No main function found\n"
-        main_prog += "\nend program main\n\n"
+            main_prog.append("  ! No main function found\n")
+        main_prog.append("\nend program main\n\n")
         
-        fortran_code = module_code + main_prog
-        return fortran_code
+        module_code.extend(main_prog)
+        return "".join(module_code)
 
     def translate_type(self, c_type):
         """Translate C type to Fortran type."""
-        c_type = c_type.lower()
-        if 'int' in c_type:
-            return "integer"
-        elif 'unsigned' in c_type and ('int' in c_type or 'long' in c_type):
-            return "integer"  # Fortran doesn't have unsigned types
-        elif 'long' in c_type and 'long' in c_type:
-            return "integer(kind=8)"  # long long is 64-bit
-        elif 'long' in c_type:
-            return "integer(kind=4)"  # long is typically 32-bit
-        elif 'float' in c_type:
-            return "real"
-        elif 'double' in c_type:
-            return "double precision"  # or real(kind=8)
-        elif 'char' in c_type and '*' in c_type:
-            return "character(len=100)"  # Arbitrary length
-        elif 'char' in c_type:
-            return "character"
-        elif 'bool' in c_type:
-            return "logical"
-        elif 'void' in c_type:
-            return "void"
-        else:
-            return "! Unknown type: " + c_type
+        return _translate_type(c_type)
 
     def remove_preprocessor_directives(self, c_code):
         """Remove preprocessor directives from C code."""
-        lines = c_code.split('\n')
-        filtered_lines = []
-        for line in lines:
-            stripped = line.strip()
-            if not stripped.startswith('#'):
-                filtered_lines.append(line)
-            else:
-                if stripped.startswith('#include'):
-                    filtered_lines.append(f"! {stripped}")
-        return '\n'.join(filtered_lines)
+        c_code = _PP_DEL_RE.sub('', c_code)
+        return _PP_INC_RE.sub(lambda m: f"! {m.group(0).strip()}", c_code)
 
     def extract_functions(self, c_code):
-        """Extract function definitions from C code."""
-        func_pattern = r'(\w+)\s+(\w+)\s*\((.*?)\)\s*\{((?:[^{}]|(?:\{(?:[^{}]|(?:\{(?:[^{}]|(?:\{[^{}]*\}))*\}))*\}))*)\}'
+        """
+        Extract function definitions from C code.
+        Bodies are delimited with find_matching_brace, a linear scan, rather than a
+        C parser such as pycparser, which needs preprocessed input and would drop the
+        comments that are carried over to the Fortran output. Headers are searched
+        for in a masked copy of the source so that commented-out definitions and
+        text inside string literals are not taken for functions.
+        """
         functions = {}
-        for match in re.finditer(func_pattern, c_code, re.DOTALL):
+        masked = mask_comments_and_strings(c_code)
+        pos = 0
+        while True:
+            match = _FUNC_HDR_RE.search(masked, pos)
+            if not match:
+                break
+            open_brace = match.end() - 1
+            close_brace = find_matching_brace(masked, open_brace)
+            if close_brace == -1:
+                pos = match.end()
+                continue
+            pos = close_brace + 1
             return_type = match.group(1)
             func_name = match.group(2)
             params_str = match.group(3).strip()
-            body = match.group(4)
+            body = c_code[open_brace+1:close_brace]
             params = []
+            fortran_params = []
             if params_str and params_str.lower() != "void":
                 for param in params_str.split(','):
                     param = param.strip()
                     if param:
                         params.append(param)
-            self.functions[func_name] = {"return_type": return_type, "params": params}
+                        param_parts = param.split()
+                        param_type = " ".join(param_parts[:-1])
+                        param_name = param_parts[-1].translate(_PTR_REF_DELETE)
+                        fortran_params.append((self.translate_type(param_type), param_name))
+            self.functions[func_name] = {"return_type": return_type, "params": params,
+                "fortran_return_type": self.translate_type(return_type),
+                "fortran_params": fortran_params}
             functions[func_name] = body
         return functions
 
-    def collect_declarations(self, c_body):
+    def collect_declaration(self, decl, declarations):
         """
-        Collect variable declarations from C code.
-        Return a dictionary mapping variable names to a tuple: (type, is_array, initialization).
-        Handles multiple declarations in one statement.
+        Add the variables of a C declaration statement, without its semicolon, to
+        declarations, a dictionary mapping variable names to a tuple
+        (type, is_array, initialization). Handles multiple declarations in one
+        statement. For arrays the initialization is the tuple of elements of a
+        brace initializer, or None.
         """
-        declarations = {}
-        c_lines = c_body.split('\n')
-        for line in c_lines:
-            line = line.strip()
-            if self.is_declaration(line):
-                line = line.rstrip(';')
-                tokens = line.split()
-                if not tokens:
-                    continue
-                c_type = tokens[0]
-                rest = line[len(c_type):].strip()
-                var_decls = rest.split(',')
-                for var_decl in var_decls:
-                    var_decl = var_decl.strip()
-                    if '=' in var_decl:
-                        var_name, init_value = var_decl.split('=', 1)
-                        var_name = var_name.strip()
-                        init_value = init_value.strip()
-                    else:
-                        var_name = var_decl
-                        init_value = None
-                    if '[' in var_name:
-                        var_name = var_name.split('[')[0].strip()
-                        declarations[var_name] = (c_type, True, init_value)
-                        self.variable_types[var_name] = (c_type, True)
-                    else:
-                        declarations[var_name] = (c_type, False, init_value)
-                        self.variable_types[var_name] = (c_type, False)
-        return declarations
-
-    def collect_for_loop_declarations(self, c_body):
+        head_match = _DECL_HEAD_RE.match(decl)
+        if not head_match:
+            return
+        c_type, rest = head_match.groups()
+        var_decls = _split_top_level(rest.strip())
+        for var_decl in var_decls:
+            var_decl = var_decl.strip()
+            if '=' in var_decl:
+                var_name, init_value = var_decl.split('=', 1)
+                var_name = var_name.strip()
+                init_value = init_value.strip()
+            else:
+                var_name = var_decl
+                init_value = None
+            if '[' in var_name:
+                var_name = var_name.split('[')[0].strip()
+                elements = None
+                if init_value and '{' in init_value:
+                    end, brace_elements = _brace_list_elements(init_value, init_value.find('{'))
+                    if end != -1:
+                        elements = brace_elements
+                declarations[var_name] = (c_type, True, elements)
+                self.record_variable(var_name, c_type, True)
+            else:
+                declarations[var_name] = (c_type, False, init_value)
+                self.record_variable(var_name, c_type, False)
+
+    def collect_for_loop_declaration(self, init, loop_decls):
         """
-        Scan the function body for for-loop headers that declare variables.
-        Returns a dictionary mapping variable names to Fortran declaration strings.
+        If the initialization clause of a for-loop header declares its variable,
+        add the Fortran declaration string to loop_decls, keyed by variable name.
         """
-        loop_decls = {}
-        pattern = r'for\s*\(\s*(int|float|double|char|long)\s+(\w+)\s*='
-        matches = re.findall(pattern, c_body)
-        for c_type, var_name in matches:
-            fortran_type = self.translate_type(c_type)
-            loop_decls[var_name] = f"{fortran_type} :: {var_name}"
-        return loop_decls
+        match = _FOR_DECL_RE.match(init)
+        if match:
+            c_type, var_name = match.groups()
+            loop_decls[var_name] = f"{self.translate_type(c_type)} :: {var_name}"
 
     def is_declaration(self, line):
         """Check if a line is a variable declaration."""
-        line = line.strip()
-        if not line or not line.endswith(';'):
-            return False
-        return (line.startswith('int ') or 
-                line.startswith('float ') or 
-                line.startswith('double ') or 
-                line.startswith('char ') or
-                line.startswith('long '))
+        return _DECL_RE.match(line) is not None
 
     def translate_for_loop_start(self, init, condition, increment):
         """Translate the start of a C for loop to Fortran."""
@@ -247,16 +516,16 @@ class CToFortranTranslator:
             loop_var = init_parts[0].strip()
             start_val = init_parts[1].strip()
         else:
-            return self.indent() + f"! Failed to parse for loop: for ({init}; {condition}; {increment})\n"
-        cond_parts = re.split(r'<=|<|>=|>|!=|==', condition)
-        if len(cond_parts) == 2:
-            end_var = cond_parts[1].strip()
-            if ('<' in condition) and not ('<=' in condition):
-                end_var = f"{end_var} - 1"
-            elif ('>' in condition) and not ('>=' in condition):
-                end_var = f"{end_var} + 1"
-        else:
-            return self.indent() + f"! Failed to parse for loop condition: {condition}\n"
+            return f"{self.indent()}! Failed to parse for loop: for ({init}; {condition}; {increment})\n"
+        cond_match = _COND_OP_RE.search(condition)
+        if not cond_match or _COND_OP_RE.search(condition, cond_match.end()):
+            return f"{self.indent()}! Failed to parse for loop condition: {condition}\n"
+        op = cond_match.group(0)
+        end_var = condition[cond_match.end():].strip()
+        if op == '<':
+            end_var = f"{end_var} - 1"
+        elif op == '>':
+            end_var = f"{end_var} + 1"
         step = "1"
         if '+=' in increment:
             inc_parts = increment.split('+=') 
@@ -278,11 +547,9 @@ class CToFortranTranslator:
             if '-' in inc_parts[1]:
                 sub_parts = inc_parts[1].split('-')
                 step = f"-{sub_parts[1].strip()}"
-        fortran_loop = self.indent() + f"do {loop_var} = {start_val}, {end_var}"
         if step != "1":
-            fortran_loop += f", {step}"
-        fortran_loop += "\n"
-        return fortran_loop
+            return f"{self.indent()}do {loop_var} = {start_val}, {end_var}, {step}\n"
+        return f"{self.indent()}do {loop_var} = {start_val}, {end_var}\n"
 
     def translate_for_loop_end(self):
         """Translate the end of a C for loop to Fortran."""
@@ -291,7 +558,7 @@ class CToFortranTranslator:
     def translate_while_loop_start(self, condition):
         """Translate the start of a C while loop to Fortran."""
         fortran_condition = self.translate_expression(condition)
-        return self.indent() + "do while (" + fortran_condition + ")\n"
+        return f"{self.indent()}do while ({fortran_condition})\n"
 
     def translate_while_loop_end(self):
         """Translate the end of a C while loop to Fortran."""
@@ -300,7 +567,7 @@ class CToFortranTranslator:
     def translate_if_start(self, condition):
         """Translate the start of a C if statement to Fortran."""
         fortran_condition = self.translate_expression(condition)
-        return self.indent() + "if (" + fortran_condition + ") then\n"
+        return f"{self.indent()}if ({fortran_condition}) then\n"
 
     def translate_if_end(self):
         """Translate the end of a C if statement to Fortran."""
@@ -309,7 +576,7 @@ class CToFortranTranslator:
     def translate_else_if(self, condition):
         """Translate a C else if statement to Fortran."""
         fortran_condition = self.translate_expression(condition)
-        return self.indent() + "else if (" + fortran_condition + ") then\n"
+        return f"{self.indent()}else if ({fortran_condition}) then\n"
 
     def translate_else(self):
         """Translate a C else statement to Fortran."""
@@ -327,60 +594,54 @@ class CToFortranTranslator:
             value = None
         parts = declaration.split()
         if len(parts) < 2:
-            return self.indent() + f"! Failed to parse declaration: {c_declaration}\n"
+            return f"{self.indent()}! Failed to parse declaration: {c_declaration}\n"
         c_type = parts[0]
         var_name = parts[1]
         if '[' in var_name or (value and '{' in value):
             var_name = var_name.split('[')[0].strip()
-            self.variables.add(var_name)
+            self.record_variable(var_name, c_type, True)
             fortran_type = self.translate_type(c_type)
             if value and '{' in value:
-                elements = re.search(r'\{(.*?)\}', value).group(1)
-                elements = [e.strip() for e in elements.split(',')]
+                elements = _brace_list_elements(value, value.find('{'))[1]
                 decl_line = f"{fortran_type}, dimension({len(elements)}) :: {var_name}"
                 assign_line = f"{var_name} = [{', '.join(elements)}]"
             else:
                 decl_line = f"{fortran_type}, dimension(:) :: {var_name}"
                 assign_line = ""
         else:
-            self.variables.add(var_name)
+            self.record_variable(var_name, c_type, False)
             fortran_type = self.translate_type(c_type)
             decl_line = f"{fortran_type} :: {var_name}"
             if value:
                 assign_line = f"{var_name} = {self.translate_expression(value)}"
             else:
                 assign_line = ""
-        result = self.indent() + decl_line + "\n"
         if assign_line:
-            result += self.indent() + assign_line + "\n"
-        return result
+            return f"{self.indent()}{decl_line}\n{self.indent()}{assign_line}\n"
+        return f"{self.indent()}{decl_line}\n"
 
     def translate_printf(self, c_printf):
         """Translate a C printf statement to Fortran using list-directed formatting."""
         c_printf = c_printf.rstrip(';')
-        printf_match = re.match(r'printf\s*\(\s*"(.*?)"\s*(,\s*(.*))?\s*\)', c_printf)
+        printf_match = _PRINTF_RE.match(c_printf)
         if not printf_match:
-            return self.indent() + f"! Failed to parse printf: {c_printf}\n"
+            return f"{self.indent()}! Failed to parse printf: {c_printf}\n"
         args = printf_match.group(3) if printf_match.group(3) else ""
-        fortran_print = self.indent() + "print*,"
         if args:
             arg_list = args.split(',')
             translated_args = [self.translate_expression(arg.strip()) for arg in arg_list]
-            fortran_print += " " + ", ".join(translated_args)
+            print_items = ", ".join(translated_args)
         else:
             literal = printf_match.group(1)
-            if literal:
-                fortran_print += " " + f'"{literal}"'
-            else:
-                fortran_print += " "
-        return fortran_print + "\n"
+            print_items = f'"{literal}"' if literal else ""
+        return f"{self.indent()}print*, {print_items}\n"
 
     def translate_scanf(self, c_scanf):
         """Translate a C scanf statement to Fortran read statement."""
         c_scanf = c_scanf.rstrip(';')
-        scanf_match = re.match(r'scanf\s*\(\s*"([^"]*)"\s*(,\s*(.*))?\s*\)', c_scanf)
+        scanf_match = _SCANF_RE.match(c_scanf)
         if not scanf_match:
-            return self.indent() + f"! Failed to parse scanf: {c_scanf}\n"
+            return f"{self.indent()}! Failed to parse scanf: {c_scanf}\n"
         format_str = scanf_match.group(1)
         args = scanf_match.group(3) if scanf_match.group(3) else ""
         var_list = []
@@ -391,13 +652,17 @@ class CToFortranTranslator:
                     var_list.append(arg[1:])
                 else:
                     var_list.append(arg)
-        fortran_read = self.indent() + "read(*, *"
-        fortran_read += ", iostat=result) "
-        fortran_read += ", ".join(var_list)
-        fortran_read += "\n" + self.indent() + "if (result /= 0) then\n"
-        fortran_read += self.indent() + "  ! Handle read error\n"
-        fortran_read += self.indent() + "end if\n"
-        return fortran_read
+        indent = self.indent()
+        return "".join([
+            indent, "read(*, *, iostat=result) ", ", ".join(var_list), "\n",
+            indent, "if (result /= 0) then\n",
+            indent, "  ! Handle read error\n",
+            indent, "end if\n",
+        ])
+
+    def record_variable(self, var_name, c_type, is_array):
+        """Record the C type of a declared variable and whether it is an array."""
+        self.variable_types[var_name] = (c_type, is_array)
 
     def get_var_type(self, var_name):
         """Get the type of a variable if it's known."""
@@ -407,33 +672,26 @@ class CToFortranTranslator:
 
     def translate_expression(self, c_expr):
         """Translate a C expression to Fortran using string replacements."""
-        if not c_expr:
+        if not c_expr or not _EXPR_TRIGGER_RE.search(c_expr):
+            # Nothing to rewrite, as in plain names and literals.
             return c_expr
+        cached = self._expr_cache.get(c_expr)
+        if cached is not None:
+            return cached
         fortran_expr = c_expr
-        fortran_expr = fortran_expr.replace('INT_MAX', 'huge(0)')
-        fortran_expr = fortran_expr.replace('INT_MIN', '-huge(0)')
-        fortran_expr = fortran_expr.replace('LONG_MAX', 'huge(0)')
-        fortran_expr = fortran_expr.replace('NULL', 'null()')
         if '[' in fortran_expr and ']' in fortran_expr:
-            array_pattern = r'(\w+)\s*\[([^]]+)\]'
-            while re.search(array_pattern, fortran_expr):
-                fortran_expr = re.sub(array_pattern, r'\1(\2+1)', fortran_expr)
+            fortran_expr = _rewrite_subscripts(fortran_expr)
         if '{' in fortran_expr and '}' in fortran_expr:
-            array_init_pattern = r'\{([^{}]*)\}'
-            fortran_expr = re.sub(array_init_pattern, r'[\1]', fortran_expr)
-        fortran_expr = fortran_expr.replace('==', ' == ')
-        fortran_expr = fortran_expr.replace('!=', ' /= ')
-        fortran_expr = fortran_expr.replace('>=', ' >= ')
-        fortran_expr = fortran_expr.replace('<=', ' <= ')
-        fortran_expr = fortran_expr.replace('>', ' > ')
-        fortran_expr = fortran_expr.replace('<', ' < ')
-        fortran_expr = fortran_expr.replace('&&', ' .and. ')
-        fortran_expr = fortran_expr.replace('||', ' .or. ')
-        if fortran_expr.strip().startswith('!'):
-            fortran_expr = '.not.' + fortran_expr.strip()[1:]
-        sizeof_pattern = r'sizeof\s*\(\s*(\w+)\s*\)'
-        if re.search(sizeof_pattern, fortran_expr):
-            fortran_expr = re.sub(sizeof_pattern, r'kind(0)', fortran_expr)
+            fortran_expr = _rewrite_brace_lists(fortran_expr)
+        if '<<' in fortran_expr or '>>' in fortran_expr:
+            fortran_expr = _rewrite_shifts(fortran_expr)
+        fortran_expr = _TOKEN_RE.sub(_token_replacement, fortran_expr)
+        stripped = fortran_expr.strip()
+        if stripped.startswith('!'):
+            fortran_expr = '.not.' + stripped[1:]
+        if 'sizeof' in fortran_expr:
+            fortran_expr = _SIZEOF_RE.sub('kind(0)', fortran_expr)
+        self._expr_cache[c_expr] = fortran_expr
         return fortran_expr
 
     def translate_updating_operator(self, c_line):
@@ -444,7 +702,7 @@ class CToFortranTranslator:
         a *= b  ->  a = a * b,
         a /= b  ->  a = a / b
         """
-        match = re.match(r'(\w+)\s*([\+\-\*/])=\s*(.+)', c_line)
+        match = _UPDATE_OP_RE.match(c_line)
         if match:
             var = match.group(1)
             op = match.group(2)
@@ -460,229 +718,327 @@ class CToFortranTranslator:
         a separate assignment is generated. Updating operators (like a += b) are translated.
         In non-main functions, return statements are converted into an assignment to the result variable.
         At the end of processing the function body, any remaining open block is flushed.
+        The body is walked once: declarations are collected while the statements are
+        translated, and the declaration section is put in front afterwards.
         """
-        fortran_body = ""
-        body_decls = self.collect_declarations(c_body)
-        loop_decls = self.collect_for_loop_declarations(c_body)
-        all_decls = {}
-        for var_name, decl in loop_decls.items():
-            all_decls[var_name] = (decl, "")
+        header_indent = self.indent()
+        statements = []
+        body_decls = {}
+        loop_decls = {}
+        self.block_types = []
+        self.block_indents = []
+        # Local names for what the loop calls on every line.
+        handlers = self._HANDLERS
+        classify = self._classify
+        match_declaration = _DECL_RE.match
+        collect_declaration = self.collect_declaration
+        collect_for_loop_declaration = self.collect_for_loop_declaration
+        for line in c_body.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            decl_match = match_declaration(line)
+            if decl_match:
+                collect_declaration(decl_match.group(1).rstrip(';'), body_decls)
+                # A comment after the declaration is still translated.
+                line = line[decl_match.end(1):].strip()
+                if not line:
+                    continue
+            event = classify(line)
+            kind = event[0]
+            if kind == 'for':
+                collect_for_loop_declaration(event[1], loop_decls)
+            handlers[kind](self, event, statements, is_main)
+        # Flush any remaining open blocks.
+        while self.block_types:
+            self._close_block(statements)
+        # Declarations go before the assignments of initial values, which are
+        # executable statements in Fortran.
+        fortran_body = [f"{header_indent}{decl}\n" for var_name, decl in loop_decls.items()
+                        if var_name not in body_decls]
+        assign_lines = []
         for var_name, (var_type, is_array, init) in body_decls.items():
             fortran_type = self.translate_type(var_type)
             if is_array:
                 if init:
-                    elements = re.search(r'\{(.*?)\}', init).group(1)
-                    elements = [e.strip() for e in elements.split(',')]
-                    decl_line = f"{fortran_type}, dimension({len(elements)}) :: {var_name}"
-                    assign_line = f"{var_name} = [{', '.join(elements)}]"
+                    fortran_body.append(f"{header_indent}{fortran_type}, dimension({len(init)}) :: {var_name}\n")
+                    assign_lines.append(f"{header_indent}{var_name} = [{', '.join(init)}]\n")
                 else:
-                    decl_line = f"{fortran_type}, dimension(:) :: {var_name}"
-                    assign_line = ""
+                    fortran_body.append(f"{header_indent}{fortran_type}, dimension(:) :: {var_name}\n")
             else:
-                decl_line = f"{fortran_type} :: {var_name}"
+                fortran_body.append(f"{header_indent}{fortran_type} :: {var_name}\n")
                 if init is not None:
-                    assign_line = f"{var_name} = {self.translate_expression(init)}"
-                else:
-                    assign_line = ""
-            all_decls[var_name] = (decl_line, assign_line)
-        # Output declarations.
-        for decl_line, _ in all_decls.values():
-            fortran_body += self.indent() + decl_line + "\n"
-        # Then output assignments.
-        for _, assign_line in all_decls.values():
-            if assign_line:
-                fortran_body += self.indent() + assign_line + "\n"
+                    assign_lines.append(f"{header_indent}{var_name} = {self.translate_expression(init)}\n")
         if "scanf" in c_body:
-            fortran_body += self.indent() + "integer :: result  ! For I/O status\n"
-        fortran_body += "\n"
-        c_lines = c_body.split('\n')
-        i = 0
-        block_stack = []
-        while i < len(c_lines):
-            line = c_lines[i].strip()
-            if not line:
-                i += 1
-                continue
-            if self.is_declaration(line):
-                i += 1
-                continue
-            # Remove inline comments before processing.
-            line_no_comment = line.split('//')[0].strip()
-            if line_no_comment.endswith(';'):
-                line_code = line_no_comment.rstrip(';').strip()
-                updated = self.translate_updating_operator(line_code)
-                if updated is not None:
-                    fortran_body += self.indent() + updated + "\n"
-                    i += 1
-                    continue
-            if line.startswith('return'):
-                return_val = line.replace('return', '').replace(';', '').strip()
-                if not is_main and return_val:
-                    fortran_body += self.indent() + f"{self.current_function}_result = {self.translate_expression(return_val)}\n"
-                i += 1
-                continue
-            if line.startswith('if') and '(' in line and ')' in line:
-                condition = line[line.find('(')+1:line.rfind(')')].strip()
-                fortran_body += self.translate_if_start(condition)
-                if ';' in line and not '{' in line:
-                    statement = line[line.rfind(')')+1:].strip().rstrip(';')
-                    self.indent_level += 1
-                    if statement.startswith('return'):
-                        i += 1
-                        continue
-                    elif statement.startswith('printf'):
-                        fortran_body += self.translate_printf(statement)
-                    else:
-                        fortran_body += self.indent() + self.translate_expression(statement) + "\n"
-                    self.indent_level -= 1
-                    fortran_body += self.translate_if_end()
-                    i += 1
-                    continue
-                block_stack.append(('if', self.indent_level))
-                self.indent_level += 1
-                i += 1
-                continue
-            if line.startswith('else if') and '(' in line and ')' in line:
-                condition = line[line.find('(')+1:line.rfind(')')].strip()
-                fortran_body += self.translate_else_if(condition)
-                if ';' in line and not '{' in line:
-                    statement = line[line.rfind(')')+1:].strip().rstrip(';')
-                    self.indent_level += 1
-                    if statement.startswith('return'):
-                        i += 1
-                        continue
-                    elif statement.startswith('printf'):
-                        fortran_body += self.translate_printf(statement)
-                    else:
-                        fortran_body += self.indent() + self.translate_expression(statement) + "\n"
-                    self.indent_level -= 1
-                    i += 1
-                    continue
-                self.indent_level += 1
-                i += 1
-                continue
-            if line.startswith('else') and not 'if' in line:
-                fortran_body += self.translate_else()
-                if ';' in line and not '{' in line:
-                    statement = line[line.replace('else', '', 1).strip()].strip().rstrip(';')
-                    self.indent_level += 1
-                    if statement.startswith('return'):
-                        i += 1
-                        continue
-                    elif statement.startswith('printf'):
-                        fortran_body += self.translate_printf(statement)
-                    else:
-                        fortran_body += self.indent() + self.translate_expression(statement) + "\n"
-                    self.indent_level -= 1
-                    i += 1
-                    continue
-                self.indent_level += 1
-                i += 1
-                continue
-            if line.startswith('for') and '(' in line and ')' in line:
-                loop_parts = line[line.find('(')+1:line.rfind(')')].split(';')
-                if len(loop_parts) == 3:
-                    init = loop_parts[0].strip()
-                    condition = loop_parts[1].strip()
-                    increment = loop_parts[2].strip()
-                    fortran_body += self.translate_for_loop_start(init, condition, increment)
-                    if ';' in line[line.rfind(')')+1:] and not '{' in line:
-                        statement = line[line.rfind(')')+1:].strip().rstrip(';')
-                        self.indent_level += 1
-                        if statement.startswith('return'):
-                            i += 1
-                            continue
-                        elif statement.startswith('printf'):
-                            fortran_body += self.translate_printf(statement)
-                        else:
-                            fortran_body += self.indent() + self.translate_expression(statement) + "\n"
-                        self.indent_level -= 1
-                        fortran_body += self.translate_for_loop_end()
-                        i += 1
-                        continue
-                    block_stack.append(('for', self.indent_level))
-                    self.indent_level += 1
-                    i += 1
-                    continue
-            if line.startswith('while') and '(' in line and ')' in line:
-                condition = line[line.find('(')+1:line.rfind(')')].strip()
-                fortran_body += self.translate_while_loop_start(condition)
-                if ';' in line[line.rfind(')')+1:] and not '{' in line:
-                    statement = line[line.rfind(')')+1:].strip().rstrip(';')
-                    self.indent_level += 1
-                    if statement.startswith('return'):
-                        i += 1
-                        continue
-                    elif statement.startswith('printf'):
-                        fortran_body += self.translate_printf(statement)
-                    else:
-                        fortran_body += self.indent() + self.translate_expression(statement) + "\n"
-                    self.indent_level -= 1
-                    fortran_body += self.translate_while_loop_end()
-                    i += 1
-                    continue
-                block_stack.append(('while', self.indent_level))
-                self.indent_level += 1
-                i += 1
-                continue
-            if line == '{':
-                i += 1
-                continue
-            if line == '}':
-                if block_stack:
-                    block_type, old_indent = block_stack.pop()
-                    self.indent_level = old_indent
-                    if block_type == 'if':
-                        fortran_body += self.translate_if_end()
-                    elif block_type == 'for':
-                        fortran_body += self.translate_for_loop_end()
-                    elif block_type == 'while':
-                        fortran_body += self.translate_while_loop_end()
-                else:
-                    fortran_body += self.indent() + "! Warning: unmatched closing brace\n"
-                i += 1
-                continue
-            if line.startswith('printf'):
-                fortran_body += self.translate_printf(line)
-                i += 1
-                continue
-            if line.startswith('scanf'):
-                fortran_body += self.translate_scanf(line)
-                i += 1
-                continue
-            if line.endswith(';'):
-                line = line.rstrip(';')
-                if '=' in line and not '==' in line and not '<=' in line and not '>=' in line and not '!=' in line:
-                    parts = line.split('=', 1)
-                    lhs = parts[0].strip()
-                    rhs = parts[1].strip()
-                    lhs_translated = self.translate_expression(lhs)
-                    rhs_translated = self.translate_expression(rhs)
-                    fortran_body += self.indent() + f"{lhs_translated} = {rhs_translated}\n"
-                else:
-                    fortran_body += self.indent() + self.translate_expression(line) + "\n"
-                i += 1
-                continue
-            if line.startswith('//'):
-                comment = line[2:].strip()
-                fortran_body += self.indent() + f"! {comment}\n"
-                i += 1
-                continue
-            print("line:", line) # debug
+            fortran_body.append(f"{header_indent}integer :: result  ! For I/O status\n")
+        fortran_body.extend(assign_lines)
+        fortran_body.append("\n")
+        fortran_body.extend(statements)
+        return remove_newlines_in_quotes("".join(fortran_body))
+
+    def _split_header(self, line):
+        """
+        Split a control statement such as 'while (cond) stmt;' into the text inside
+        its parentheses and the text after them. Returns None if the line has no
+        balanced parenthesized header.
+        """
+        open_paren = line.find('(')
+        if open_paren == -1:
+            return None
+        close_paren = find_matching_brace(line, open_paren)
+        if close_paren == -1:
+            return None
+        return line[open_paren+1:close_paren], line[close_paren+1:]
+
+    def _single_stmt(self, tail):
+        """
+        Return the statement, without its semicolon, that follows the header of a
+        control line written without braces, such as 'x = 1' in 'if (c) x = 1;'.
+        Returns None if the body is a block. Braces and semicolons inside literals
+        and comments are ignored.
+        """
+        masked = mask_comments_and_strings(tail)
+        end = masked.rfind(';')
+        if end == -1 or '{' in masked:
+            return None
+        return tail[:end].strip().rstrip(';')
+
+    def _classify(self, line):
+        """
+        Classify a stripped C line that is neither blank nor a declaration.
+        Returns a tuple whose first item names the kind of statement and whose
+        other items are the parts of the line its handler needs, so that each
+        line is parsed only once. The leading token selects a classifier from
+        _CLASSIFIERS; lines it does not recognize are plain statements.
+        """
+        match = _STMT_RE.match(line)
+        if match:
+            token = match.group(0)
+            classifier = self._CLASSIFIERS.get(token)
+            if classifier is not None:
+                event = classifier(self, token, line)
+                if event is not None:
+                    return event
+        return ('statement', line)
+
+    def _classify_return(self, token, line):
+        return ('return', line[len('return'):].rstrip(';').strip())
+
+    def _classify_if(self, token, line):
+        header = self._split_header(line)
+        if header is not None:
+            return ('if', header[0].strip(), self._single_stmt(header[1]))
+        return None
+
+    def _classify_else(self, token, line):
+        if line.startswith('else if'):
+            header = self._split_header(line)
+            if header is not None:
+                return ('else if', header[0].strip(), self._single_stmt(header[1]))
+            return None
+        return ('else', self._single_stmt(line[len('else'):]))
+
+    def _classify_for(self, token, line):
+        header = self._split_header(line)
+        if header is not None:
+            inner, tail = header
+            # Semicolons inside character or string literals do not separate clauses.
+            masked = mask_comments_and_strings(inner)
+            first = masked.find(';')
+            second = masked.find(';', first + 1)
+            if first != -1 and second != -1 and masked.find(';', second + 1) == -1:
+                return ('for', inner[:first].strip(), inner[first+1:second].strip(),
+                        inner[second+1:].strip(), self._single_stmt(tail))
+        return None
+
+    def _classify_while(self, token, line):
+        header = self._split_header(line)
+        if header is not None:
+            return ('while', header[0].strip(), self._single_stmt(header[1]))
+        return None
+
+    def _classify_whole_line(self, token, line):
+        return (token, line)
+
+    def _classify_comment(self, token, line):
+        return ('//', line[2:].strip())
+
+    _CLASSIFIERS = {
+        'return': _classify_return,
+        'if': _classify_if,
+        'else': _classify_else,
+        'for': _classify_for,
+        'while': _classify_while,
+        '{': _classify_whole_line,
+        '}': _classify_whole_line,
+        'printf': _classify_whole_line,
+        'scanf': _classify_whole_line,
+        '//': _classify_comment,
+    }
+
+    def _emit_single_stmt(self, statement, is_main):
+        """Translate the lone statement of a block written without braces."""
+        match = _STMT_RE.match(statement)
+        first = match.group(0) if match else ''
+        if first == 'return':
+            return_val = statement[len('return'):].strip()
+            if not is_main and return_val:
+                return f"{self.indent()}{self.result_name} = {self.translate_expression(return_val)}\n"
+            return ""
+        if first == 'printf':
+            return self.translate_printf(statement)
+        return f"{self.indent()}{self.translate_expression(statement)}\n"
+
+    def _emit_nested_stmt(self, statement, is_main):
+        """Translate the single-statement body of a control line one level deeper."""
+        self.indent_level += 1
+        fortran_stmt = self._emit_single_stmt(statement, is_main)
+        self.indent_level -= 1
+        return fortran_stmt
+
+    # Handlers keyed by the kind of statement returned by _classify. Each appends
+    # the translation of the statement to fortran_body.
+    def _handle_return(self, event, fortran_body, is_main):
+        _, return_val = event
+        if not is_main and return_val:
+            fortran_body.append(f"{self.indent()}{self.result_name} = {self.translate_expression(return_val)}\n")
+
+    def _handle_if(self, event, fortran_body, is_main):
+        _, condition, statement = event
+        fortran_body.append(self.translate_if_start(condition))
+        if statement is not None:
+            fortran_body.append(self._emit_nested_stmt(statement, is_main))
+            fortran_body.append(self.translate_if_end())
+            return
+        self._open_block(_IF_BLOCK)
+
+    def _handle_else_if(self, event, fortran_body, is_main):
+        _, condition, statement = event
+        fortran_body.append(self.translate_else_if(condition))
+        if statement is not None:
+            fortran_body.append(self._emit_nested_stmt(statement, is_main))
+            return
+        self.indent_level += 1
+
+    def _handle_else(self, event, fortran_body, is_main):
+        _, statement = event
+        fortran_body.append(self.translate_else())
+        if statement is not None:
+            fortran_body.append(self._emit_nested_stmt(statement, is_main))
+            return
+        self.indent_level += 1
+
+    def _handle_for(self, event, fortran_body, is_main):
+        _, init, condition, increment, statement = event
+        fortran_body.append(self.translate_for_loop_start(init, condition, increment))
+        if statement is not None:
+            fortran_body.append(self._emit_nested_stmt(statement, is_main))
+            fortran_body.append(self.translate_for_loop_end())
+            return
+        self._open_block(_FOR_BLOCK)
+
+    def _handle_while(self, event, fortran_body, is_main):
+        _, condition, statement = event
+        fortran_body.append(self.translate_while_loop_start(condition))
+        if statement is not None:
+            fortran_body.append(self._emit_nested_stmt(statement, is_main))
+            fortran_body.append(self.translate_while_loop_end())
+            return
+        self._open_block(_WHILE_BLOCK)
+
+    def _handle_open_brace(self, event, fortran_body, is_main):
+        pass
+
+    def _open_block(self, block_type):
+        """Push a block that is closed by a later '}' and indent its body."""
+        self.block_types.append(block_type)
+        self.block_indents.append(self.indent_level)
+        self.indent_level += 1
+
+    def _close_block(self, fortran_body):
+        """Pop the innermost open block and emit its end statement."""
+        block_type = self.block_types.pop()
+        self.indent_level = self.block_indents.pop()
+        fortran_body.append(self._BLOCK_ENDS[block_type](self))
+
+    def _handle_close_brace(self, event, fortran_body, is_main):
+        if self.block_types:
+            self._close_block(fortran_body)
+        else:
+            fortran_body.append(f"{self.indent()}! Warning: unmatched closing brace\n")
+
+    def _handle_printf(self, event, fortran_body, is_main):
+        fortran_body.append(self.translate_printf(event[1]))
+
+    def _handle_scanf(self, event, fortran_body, is_main):
+        fortran_body.append(self.translate_scanf(event[1]))
+
+    def _handle_comment(self, event, fortran_body, is_main):
+        fortran_body.append(f"{self.indent()}! {event[1]}\n")
+
+    def _handle_statement(self, event, fortran_body, is_main):
+        """Translate a line that does not start with a recognized keyword."""
+        _, line = event
+        # Separate an inline comment, which is carried over after the statement.
+        line, comment = split_line_comment(line)
+        line = line.strip()
+        end = f" ! {comment.strip()}\n" if comment is not None else "\n"
+        indent = self.indent()
+        translate_expression = self.translate_expression
+        if line.endswith(';'):
+            line = line.rstrip(';').strip()
+            updated = self.translate_updating_operator(line)
+            if updated is not None:
+                fortran_body.append(f"{indent}{updated}{end}")
+                return
+            # An '=' inside a string or character literal does not assign.
+            if '"' in line or "'" in line:
+                assign_match = _ASSIGN_RE.search(mask_comments_and_strings(line))
+            else:
+                assign_match = _ASSIGN_RE.search(line)
+            if assign_match:
+                lhs = line[:assign_match.start()].strip()
+                rhs = line[assign_match.end():].strip()
+                lhs_translated = translate_expression(lhs)
+                rhs_translated = translate_expression(rhs)
+                fortran_body.append(f"{indent}{lhs_translated} = {rhs_translated}{end}")
+                return
             var_name, xop = get_before_inc_dec(line)
-            if xop == "++" or xop == "--":
-                fortran_line = var_name + " = " + var_name + " " + xop[0] + " 1"
-                fortran_body += self.indent() + fortran_line + "\n"
-            i += 1
-        # Flush any remaining open blocks.
-        while block_stack:
-            block_type, old_indent = block_stack.pop()
-            self.indent_level = old_indent
-            if block_type == 'if':
-                fortran_body += self.indent() + "end if\n"
-            elif block_type == 'for':
-                fortran_body += self.indent() + "end do\n"
-            elif block_type == 'while':
-                fortran_body += self.indent() + "end do\n"
-        fortran_body = remove_newlines_in_quotes(fortran_body)
-        return fortran_body
+            if xop and line.endswith(xop):
+                var_name = translate_expression(var_name)
+                fortran_body.append(f"{indent}{var_name} = {var_name} {xop[0]} 1{end}")
+            else:
+                fortran_body.append(f"{indent}{translate_expression(line)}{end}")
+            return
+        print("line:", line) # debug
+        var_name, xop = get_before_inc_dec(line)
+        if xop == "++" or xop == "--":
+            var_name = translate_expression(var_name)
+            fortran_body.append(f"{indent}{var_name} = {var_name} {xop[0]} 1{end}")
+
+    _HANDLERS = {
+        'return': _handle_return,
+        'if': _handle_if,
+        'else if': _handle_else_if,
+        'else': _handle_else,
+        'for': _handle_for,
+        'while': _handle_while,
+        '{': _handle_open_brace,
+        '}': _handle_close_brace,
+        'printf': _handle_printf,
+        'scanf': _handle_scanf,
+        '//': _handle_comment,
+        'statement': _handle_statement,
+    }
+
+    # End statements for each kind of block, indexed by the block constants.
+    _BLOCK_ENDS = (translate_if_end, translate_for_loop_end, translate_while_loop_end)
+
+
+def _translate_function_body(func_name, c_body):
+    """Translate the body of a non-main function with a fresh translator.
+    Defined at module level so that worker processes can run it."""
+    translator = CToFortranTranslator()
+    translator.current_function = func_name
+    translator.result_name = f"{func_name}_result"
+    return translator.translate_function_body_iterative(c_body)
@@ -11,28 +11,49 @@ Major improvements:
 - Improved I/O handling
 - Better type handling
 
-Usage: python improved_c_to_fortran.py input.c output.f90
+Usage: python improved_c_to_fortran.py [--jobs N] input.c output.f90 [input2.c output2.f90 ...]
+With several pairs of files and --jobs N, the files are translated by N processes.
 """
 
 import sys
 import os.path
+import multiprocessing
 from c_to_fortran_translator import CToFortranTranslator
 
+USAGE = "Usage: python improved_c_to_fortran.py [--jobs N] input.c output.f90 [input2.c output2.f90 ...]"
+
+def translate_one(input_file, output_file):
+    """Translate one file with a translator of its own, so that it can run in a worker process."""
+    return CToFortranTranslator().translate_file(input_file, output_file)
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python improved_c_to_fortran.py input.c output.f90")
+    args = sys.argv[1:]
+    jobs = 1
+    if args and args[0] == "--jobs":
+        if len(args) < 2 or not args[1].isdigit() or int(args[1]) < 1:
+            print(USAGE)
+            sys.exit(1)
+        jobs = int(args[1])
+        args = args[2:]
+    if not args or len(args) % 2 != 0:
+        print(USAGE)
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    file_pairs = list(zip(args[0::2], args[1::2]))
     
-    if not os.path.exists(input_file):
-        print(f"Error: Input file '{input_file}' not found.")
-        sys.exit(1)
+    for input_file, _ in file_pairs:
+        if not os.path.exists(input_file):
+            print(f"Error: Input file '{input_file}' not found.")
+            sys.exit(1)
     
     try:
-        translator = CToFortranTranslator()
-        if translator.translate_file(input_file, output_file):
+        if jobs > 1 and len(file_pairs) > 1:
+            with multiprocessing.Pool(min(jobs, len(file_pairs))) as pool:
+                results = pool.starmap(translate_one, file_pairs)
+        else:
+            results = [translate_one(input_file, output_file)
+                       for input_file, output_file in file_pairs]
+        if all(results):
             print("Successfully translated C code to Fortran.")
     except Exception as e:
         print(f"Error during translation: {str(e)}")
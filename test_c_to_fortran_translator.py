@@ -0,0 +1,118 @@
+"""
+Tests for the translation of C expressions by CToFortranTranslator.
+"""
+
+import unittest
+
+from c_to_fortran_translator import CToFortranTranslator
+
+
+class TestShiftTranslation(unittest.TestCase):
+    """C shifts bind more loosely than arithmetic and more tightly than comparisons."""
+
+    def setUp(self):
+        self.translator = CToFortranTranslator()
+
+    def check(self, c_expr, fortran_expr):
+        self.assertEqual(self.translator.translate_expression(c_expr), fortran_expr)
+
+    def test_arithmetic_operands(self):
+        self.check("a << 2 + 1", "ishft(a, 2 + 1)")
+        self.check("x = a - b >> 1", "x = shifta(a - b, 1)")
+        self.check("a*b << 2", "ishft(a*b, 2)")
+        self.check("-a >> 1", "shifta(-a, 1)")
+
+    def test_chain_is_left_associative(self):
+        self.check("a >> b >> c", "shifta(shifta(a, b), c)")
+        self.check("a << b >> c", "shifta(ishft(a, b), c)")
+
+    def test_bracketed_operands(self):
+        self.check("(a+b) << 1", "ishft((a+b), 1)")
+        self.check("v[i] >> 2", "shifta(v(i+1), 2)")
+        self.check("f(a, b << 1)", "f(a, ishft(b, 1))")
+
+    def test_comparisons_bound_operands(self):
+        self.check("(x >> 1) == 0 && y << 2 != 4",
+                   "(shifta(x, 1))  ==  0  .and.  ishft(y, 2)  /=  4")
+
+    def test_untranslatable_shift_is_kept(self):
+        self.check("a << (b", "a << (b")
+
+
+class TestTypeTranslation(unittest.TestCase):
+    """C type spellings and the Fortran types they translate to."""
+
+    CASES = (
+        ("int", "integer"),
+        ("unsigned", "integer"),
+        ("unsigned int", "integer"),
+        ("short", "integer"),
+        ("long", "integer(kind=4)"),
+        ("long int", "integer(kind=4)"),
+        ("unsigned long", "integer(kind=4)"),
+        ("long long", "integer(kind=8)"),
+        ("long long int", "integer(kind=8)"),
+        ("unsigned long long", "integer(kind=8)"),
+        ("float", "real"),
+        ("double", "double precision"),
+        ("long double", "double precision"),
+        ("char", "character"),
+        ("unsigned char", "character"),
+        ("char *", "character(len=100)"),
+        ("char*", "character(len=100)"),
+        ("const char *", "character(len=100)"),
+        ("bool", "logical"),
+        ("void", "void"),
+    )
+
+    def test_types(self):
+        translator = CToFortranTranslator()
+        for c_type, fortran_type in self.CASES:
+            with self.subTest(c_type=c_type):
+                self.assertEqual(translator.translate_type(c_type), fortran_type)
+
+
+class TestStatementTranslation(unittest.TestCase):
+    """Statements in a function body are translated one line at a time."""
+
+    def translate_main(self, body):
+        """Return the non-blank lines of the Fortran main program for a C main body."""
+        fortran = CToFortranTranslator().translate_code(f"int main() {{\n{body}    return 0;\n}}\n")
+        return [line for line in fortran.splitlines() if line.strip()]
+
+    def test_postfix_increment_of_array_element(self):
+        self.assertIn("a(i+1) = a(i+1) + 1", self.translate_main("    int a[3];\n    a[i]++;\n"))
+
+    def test_postfix_decrement_with_comment(self):
+        self.assertIn("n = n - 1 ! down", self.translate_main("    int n = 1;\n    n--; // down\n"))
+
+
+class TestParallelTranslation(unittest.TestCase):
+    """Translating function bodies in worker processes does not change the output."""
+
+    SOURCE = """int square(int x) {
+    return x * x;
+}
+
+int total(int n) {
+    int s = 0;
+    for (int i = 0; i < n; i++) {
+        s += square(i);
+    }
+    return s;
+}
+
+int main() {
+    printf("%d\\n", total(4));
+    return 0;
+}
+"""
+
+    def test_workers_match_serial(self):
+        serial = CToFortranTranslator().translate_code(self.SOURCE)
+        parallel = CToFortranTranslator().translate_code(self.SOURCE, workers=2)
+        self.assertEqual(parallel, serial)
+
+
+if __name__ == "__main__":
+    unittest.main()
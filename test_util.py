@@ -0,0 +1,27 @@
+"""
+Tests for the text helpers in util.
+"""
+
+import unittest
+
+from util import remove_newlines_in_quotes
+
+
+class TestRemoveNewlinesInQuotes(unittest.TestCase):
+    """Only '\\n' escapes inside string and character literals are removed."""
+
+    def test_newline_escapes_in_literals(self):
+        self.assertEqual(remove_newlines_in_quotes(r'printf("a\n%d\n", x);'),
+                         r'printf("a%d", x);')
+        self.assertEqual(remove_newlines_in_quotes(r"c = '\n';"), "c = '';")
+
+    def test_escaped_backslash_before_n(self):
+        self.assertEqual(remove_newlines_in_quotes(r'printf("a\\n");'), r'printf("a\\n");')
+        self.assertEqual(remove_newlines_in_quotes(r'printf("a\\\n");'), r'printf("a\\");')
+
+    def test_text_outside_literals(self):
+        self.assertEqual(remove_newlines_in_quotes(r'x = 1; // \n'), r'x = 1; // \n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,30 +1,32 @@
+import re
+from itertools import islice
+
+_COMMENT_OR_STRING_RE = re.compile(
+    r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_NON_NEWLINE_RE = re.compile(r'[^\n]')
+_BLANK_LINE_RE = re.compile(r'^[^\S\n]*(?:\n|\Z)', re.MULTILINE)
+# A string or character literal on one line; escapes are consumed in pairs
+_QUOTED_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'')
+# One escape sequence within a literal
+_ESCAPE_RE = re.compile(r'\\.')
+_INC_DEC_RE = re.compile(r'\+\+|--')
+# Keywords that open a Fortran block, matched at the start of a lower-cased line
+_BLOCK_KEYWORD_RE = re.compile(r'(?:module|program|subroutine|function)\b')
+_MODULE_KEYWORD_RE = re.compile(r'module\b')
+_PROCEDURE_KEYWORD_RE = re.compile(r'(?:subroutine|function)\b')
+_LINE_COMMENT_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//')
+
+def _remove_newline_escapes(match):
+    """Delete the '\\n' escapes from a literal matched by _QUOTED_RE, leaving
+    other escapes, such as the escaped backslash in '\\\\n', intact."""
+    return _ESCAPE_RE.sub(lambda e: '' if e.group() == '\\n' else e.group(), match.group())
+
 def remove_newlines_in_quotes(text):
     """Remove literal '\n' sequences within single- or
     double-quoted text in a string, preserving '\n' outside quotes."""
-    result = []
-    i = 0
-    in_quote = False
-    quote_char = None
-    
-    while i < len(text):
-        if text[i] in ('"', "'") and (i == 0 or text[i-1] != '\\'):
-            # Toggle quote state
-            if in_quote and text[i] == quote_char:
-                in_quote = False
-                quote_char = None
-            elif not in_quote:
-                in_quote = True
-                quote_char = text[i]
-            result.append(text[i])
-            i += 1
-        elif in_quote and text[i] == '\\' and i + 1 < len(text) and text[i + 1] == 'n':
-            # Skip \n inside quotes
-            i += 2
-        else:
-            # Copy character as is
-            result.append(text[i])
-            i += 1
-    return ''.join(result)
+    if '\\n' not in text:
+        return text
+    return _QUOTED_RE.sub(_remove_newline_escapes, text)
 
 def get_before_inc_dec(line):
     """Extracts the substring before '++' or '--' and identifies the operator.
@@ -35,16 +37,88 @@ def get_before_inc_dec(line):
     Returns:
         tuple: (substring before '++' or '--' or '', operator '++', '--', or '').
     """
-    pos_plus = line.find('++')
-    pos_minus = line.find('--')
-    
-    if pos_plus == -1 and pos_minus == -1:
+    match = _INC_DEC_RE.search(line)
+    if match is None:
         return ("", "")
-    
-    if pos_plus != -1 and (pos_minus == -1 or pos_plus < pos_minus):
-        return (line[:pos_plus].strip(), "++")
-    else:
-        return (line[:pos_minus].strip(), "--")
+    return (line[:match.start()].strip(), match.group())
+
+def find_matching_brace(text, start):
+    """Find the bracket that closes the '{', '(' or '[' at text[start].
+
+    Scans forward once, tracking nesting depth and skipping over string
+    and character literals and // and /* */ comments.
+
+    Args:
+        text (str): Input string to scan.
+        start (int): Index of the opening bracket.
+
+    Returns:
+        int: Index of the matching closing bracket, or -1 if it is not found.
+    """
+    open_char = text[start]
+    close_char = {'{': '}', '(': ')', '[': ']'}[open_char]
+    depth = 0
+    i = start
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == open_char:
+            depth += 1
+        elif c == close_char:
+            depth -= 1
+            if depth == 0:
+                return i
+        elif c == '"' or c == "'":
+            # Skip to the closing quote, honoring backslash escapes.
+            i += 1
+            while i < n and text[i] != c:
+                if text[i] == '\\':
+                    i += 1
+                i += 1
+        elif c == '/' and i + 1 < n and text[i + 1] == '/':
+            i = text.find('\n', i)
+            if i == -1:
+                return -1
+        elif c == '/' and i + 1 < n and text[i + 1] == '*':
+            i = text.find('*/', i + 2)
+            if i == -1:
+                return -1
+            i += 1
+        i += 1
+    return -1
+
+def mask_comments_and_strings(text):
+    """Blank out comments and string and character literals in C source.
+
+    Every masked character becomes a space except newlines, so the result has
+    the same length and line structure as text and indices found in it can be
+    used to slice the original.
+
+    Args:
+        text (str): C source code.
+
+    Returns:
+        str: text with comment and literal contents replaced by spaces.
+    """
+    return _COMMENT_OR_STRING_RE.sub(
+        lambda m: _NON_NEWLINE_RE.sub(' ', m.group()), text)
+
+def split_line_comment(line):
+    """Split a line of C code at a // comment that is not inside a literal.
+
+    Args:
+        line (str): A single line of C code.
+
+    Returns:
+        tuple: (code before the comment, comment text after '//'), with the
+        comment text None if the line has no comment.
+    """
+    if '//' not in line:
+        return line, None
+    for match in _LINE_COMMENT_RE.finditer(line):
+        if match.group() == '//':
+            return line[:match.start()], line[match.end():]
+    return line, None
 
 def remove_blank_lines(text):
     """Remove blank lines from a multiline string.
@@ -55,79 +129,108 @@ def remove_blank_lines(text):
     Returns:
         str: String with blank lines removed.
     """
-    return '\n'.join(line for line in text.splitlines() if line.strip())
+    return _BLANK_LINE_RE.sub('', text).rstrip('\n')
 
-def process_segment(segment_lines: list) -> list:
+def process_segment(segment_lines: list, out: list = None) -> list:
     """
     Given a list of lines for a block (or global code) that does not contain nested blocks,
     this function moves any declaration line (i.e. one containing "::" and not a full comment)
     to immediately after the header of the block. For functions and subroutines the header
     is taken as the initial lines up to (and including) the line with "implicit none".
     For other blocks a slightly different heuristic is used.
+    The reordered lines are appended to out, if given, which is returned.
     """
     declaration_lines = []
     other_lines = []
+    # Recorded while partitioning: the first code line of the segment, the position
+    # in other_lines of the "implicit none" line and of the first blank line after it.
+    seg_header = None
+    implicit_index = None
+    blank_index = None
     for line in segment_lines:
         stripped = line.strip()
         if "::" in line and not stripped.startswith("!"):
             declaration_lines.append(line)
-        else:
-            other_lines.append(line)
-
-    # Determine if this segment is a function or subroutine.
-    seg_header = None
-    for line in other_lines:
-        if line.strip() == "" or line.strip().startswith("!"):
             continue
-        seg_header = line.strip().lower()
-        break
+        if implicit_index is None:
+            if "implicit none" in line.lower():
+                implicit_index = len(other_lines)
+        elif blank_index is None and stripped == "":
+            blank_index = len(other_lines)
+        if seg_header is None and stripped and not stripped.startswith("!"):
+            seg_header = stripped.lower()
+        other_lines.append(line)
 
-    insertion_index = None
-    if seg_header is not None and (seg_header.startswith("function") or seg_header.startswith("subroutine")):
+    if seg_header is not None and _PROCEDURE_KEYWORD_RE.match(seg_header):
         # For functions/subroutines, we insert immediately after "implicit none" (if present).
-        for idx, line in enumerate(other_lines):
-            if "implicit none" in line.lower():
-                insertion_index = idx + 1
-                break
-        if insertion_index is None:
+        if implicit_index is not None:
+            insertion_index = implicit_index + 1
+        else:
             insertion_index = 1 if other_lines else 0
+    elif implicit_index is not None:
+        # For other blocks, use the previous heuristic, preserving any following blank line.
+        if blank_index is not None:
+            insertion_index = blank_index + 1
+        else:
+            insertion_index = implicit_index + 1
+    elif other_lines and _BLOCK_KEYWORD_RE.match(other_lines[0].lstrip().lower()):
+        insertion_index = 1
     else:
-        # For other blocks, use the previous heuristic:
-        for idx, line in enumerate(other_lines):
-            if "implicit none" in line.lower():
-                insertion_index = idx + 1
-                # Preserve any following blank line.
-                for j in range(idx + 1, len(other_lines)):
-                    if other_lines[j].strip() == "":
-                        insertion_index = j + 1
-                        break
-                break
-        if insertion_index is None:
-            if other_lines:
-                first = other_lines[0].lstrip().lower()
-                if any(first.startswith(kw) for kw in ("program", "module", "function", "subroutine")):
-                    insertion_index = 1
-                else:
-                    insertion_index = 0
-            else:
-                insertion_index = 0
+        insertion_index = 0
+
+    if out is None:
+        out = []
+    out.extend(islice(other_lines, insertion_index))
+    out.extend(declaration_lines)
+    out.extend(islice(other_lines, insertion_index, None))
+    return out
+
+
+# Tags for the lines that the block helpers look for
+_TAG_OTHER, _TAG_END, _TAG_CONTAINS, _TAG_MODULE, _TAG_PROCEDURE, _TAG_BLOCK = range(6)
+
+
+def _line_tags(lines: list) -> bytearray:
+    """
+    Classify each line once: _TAG_END for a line starting with "end", _TAG_CONTAINS,
+    _TAG_MODULE for a module line, _TAG_PROCEDURE for the start of a subroutine or
+    function, _TAG_BLOCK for the start of another block, and _TAG_OTHER otherwise.
+    """
+    tags = bytearray(len(lines))
+    for i, line in enumerate(lines):
+        low = line.lstrip().lower()
+        if low.startswith("end"):
+            tags[i] = _TAG_END
+        elif low.startswith("contains"):
+            tags[i] = _TAG_CONTAINS
+        elif _is_module_line_low(low):
+            tags[i] = _TAG_MODULE
+        elif _is_procedure_start_low(low):
+            tags[i] = _TAG_PROCEDURE
+        elif _is_block_start_low(low):
+            tags[i] = _TAG_BLOCK
+    return tags
+
+
+def _is_block_start_low(low: str) -> bool:
+    """is_block_start for a line that is already left-stripped and lower-cased."""
+    # Comments and "end" lines never match.
+    return _BLOCK_KEYWORD_RE.match(low) is not None
+
 
-    return other_lines[:insertion_index] + declaration_lines + other_lines[insertion_index:]
+def _is_module_line_low(low: str) -> bool:
+    """is_module_line for a line that is already left-stripped and lower-cased."""
+    return _MODULE_KEYWORD_RE.match(low) is not None and "module procedure" not in low
+
+
+def _is_procedure_start_low(low: str) -> bool:
+    """is_procedure_start for a line that is already left-stripped and lower-cased."""
+    return _PROCEDURE_KEYWORD_RE.match(low) is not None
 
 
 def is_block_start(line: str) -> bool:
     """Return True if a line (non-comment) starts a block (module, program, subroutine, or function)."""
-    stripped = line.lstrip()
-    if not stripped or stripped.startswith("!"):
-        return False
-    low = stripped.lower()
-    # Do not treat lines starting with "end" as block starters.
-    if low.startswith("end"):
-        return False
-    for kw in ("module", "program", "subroutine", "function"):
-        if low.startswith(kw):
-            return True
-    return False
+    return _is_block_start_low(line.lstrip().lower())
 
 
 def is_module_line(line: str) -> bool:
@@ -135,66 +238,65 @@ def is_module_line(line: str) -> bool:
     Return True if a line (non-comment) starts a module block.
     (Excludes lines like "module procedure" which belong inside modules.)
     """
-    stripped = line.lstrip()
-    if not stripped or stripped.startswith("!"):
-        return False
-    low = stripped.lower()
-    return low.startswith("module") and "module procedure" not in low
+    return _is_module_line_low(line.lstrip().lower())
 
 
 def is_procedure_start(line: str) -> bool:
     """Return True if a line starts a subroutine or function block."""
-    stripped = line.lstrip().lower()
-    return stripped.startswith("subroutine") or stripped.startswith("function")
+    return _is_procedure_start_low(line.lstrip().lower())
 
 
-def extract_block(lines: list, start_index: int) -> (list, int):
+def extract_block(lines: list, start_index: int, tags: bytearray = None) -> (list, int):
     """
     Extract a block starting at start_index (assumed to be a block start) until
     the first line that starts with "end" (case-insensitive). Returns the block
     as a list of lines and the index of the next line after the block.
+    tags, if given, holds the tag of each line from _line_tags.
     """
-    block = [lines[start_index]]
+    if tags is None:
+        tags = _line_tags(lines)
     i = start_index + 1
     while i < len(lines):
-        block.append(lines[i])
-        if lines[i].lstrip().lower().startswith("end"):
+        if tags[i] == _TAG_END:
             i += 1
             break
         i += 1
-    return block, i
+    return lines[start_index:i], i
 
 
-def process_module_block(module_block: list) -> list:
+def process_module_block(module_block: list, tags: bytearray = None, out: list = None) -> list:
     """
     Process a module block. If the module has a CONTAINS section, the block is split
     into a header (up to and including the "contains" line) and a body.
     Each procedure in the body is extracted and processed individually so that
     its declarations remain within the procedure.
+    tags, if given, holds the tag of each line from _line_tags.
+    The processed lines are appended to out, if given, which is returned.
     """
-    contains_index = None
-    for idx, line in enumerate(module_block):
-        if line.lstrip().lower().startswith("contains"):
-            contains_index = idx
-            break
+    if tags is None:
+        tags = _line_tags(module_block)
+    if out is None:
+        out = []
+    contains_index = tags.find(_TAG_CONTAINS)
+    if contains_index == -1:
+        contains_index = None
     if contains_index is not None:
-        header_part = process_segment(module_block[:contains_index])
-        contains_line = module_block[contains_index]
+        process_segment(module_block[:contains_index], out)
+        out.append(module_block[contains_index])
         body_part = module_block[contains_index+1:-1]
-        end_line = module_block[-1]
-        processed_body = []
+        body_tags = tags[contains_index+1:-1]
         i = 0
         while i < len(body_part):
-            if is_procedure_start(body_part[i]):
-                proc_block, i = extract_block(body_part, i)
-                processed_proc = process_segment(proc_block)
-                processed_body.extend(processed_proc)
+            if body_tags[i] == _TAG_PROCEDURE:
+                proc_block, i = extract_block(body_part, i, body_tags)
+                process_segment(proc_block, out)
             else:
-                processed_body.append(body_part[i])
+                out.append(body_part[i])
                 i += 1
-        return header_part + [contains_line] + processed_body + [end_line]
+        out.append(module_block[-1])
+        return out
     else:
-        return process_segment(module_block)
+        return process_segment(module_block, out)
 
 
 def move_declarations_to_top(fortran_code: str) -> str:
@@ -216,18 +318,19 @@ def move_declarations_to_top(fortran_code: str) -> str:
         str: The modified Fortran code with declaration lines moved within their blocks.
     """
     lines = fortran_code.splitlines()
+    tags = _line_tags(lines)
     result_lines = []
     i = 0
     while i < len(lines):
         line = lines[i]
-        if is_module_line(line):
-            module_block, i = extract_block(lines, i)
-            processed_module = process_module_block(module_block)
-            result_lines.extend(processed_module)
-        elif is_block_start(line):
-            block, i = extract_block(lines, i)
-            processed_block = process_segment(block)
-            result_lines.extend(processed_block)
+        tag = tags[i]
+        if tag == _TAG_MODULE:
+            start = i
+            module_block, i = extract_block(lines, i, tags)
+            process_module_block(module_block, tags[start:i], result_lines)
+        elif tag == _TAG_PROCEDURE or tag == _TAG_BLOCK:
+            block, i = extract_block(lines, i, tags)
+            process_segment(block, result_lines)
         else:
             result_lines.append(line)
             i += 1